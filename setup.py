@@ -32,7 +32,8 @@ setup(
     url='https://github.com/SkyTemple/skytemple-dtef/',
     install_requires=[
         'skytemple-files >= 1.2.0',
-        'Pillow >= 6.1.0'
+        'Pillow >= 6.1.0',
+        'numpy >= 1.16.0'
     ],
     classifiers=[
         'Development Status :: 4 - Beta',
@@ -17,11 +17,14 @@
 import os
 import re
 
-from math import floor
-from typing import List, Dict, Optional, Set, Tuple
+from contextlib import closing
+from functools import lru_cache
+from operator import itemgetter
+from typing import List, Dict, Optional, Set, Tuple, Iterator
 from xml.etree import ElementTree
 from xml.etree.ElementTree import Element
 
+import numpy as np
 from PIL import Image
 
 from skytemple_dtef.dungeon_xml import DUNGEON_TILESET, DIMENSIONS, \
@@ -41,11 +44,42 @@ from skytemple_files.graphics.dpla.model import Dpla
 
 
 CHUNK_DIM = DPC_TILING_DIM * DPCI_TILE_DIM
-PATTERN_FLOOR1 = re.compile(r"EOS_EXTRA_FLOOR1_(\d+)")
-PATTERN_FLOOR2 = re.compile(r"EOS_EXTRA_FLOOR2_(\d+)")
-PATTERN_WALL_OR_VOID = re.compile(r"EOS_EXTRA_WALL_OR_VOID_(\d+)")
-EMPTY_IMAGE = [0 for _ in range(CHUNK_DIM ** 2)]
+PATTERN_EXTRA = re.compile(r"EOS_EXTRA_(FLOOR1|FLOOR2|WALL_OR_VOID)_(\d+)")
+EXTRA_TYPES = {
+    'FLOOR1': DmaExtraType.FLOOR1,
+    'FLOOR2': DmaExtraType.FLOOR2,
+    'WALL_OR_VOID': DmaExtraType.WALL_OR_VOID
+}
+EMPTY_BYTES = bytes(CHUNK_DIM * CHUNK_DIM)
+CHUNK_BUF_INITIAL_CAPACITY = 256
 FULL = DmaNeighbor.NORTH_WEST | DmaNeighbor.NORTH | DmaNeighbor.NORTH_EAST | DmaNeighbor.WEST | DmaNeighbor.EAST | DmaNeighbor.SOUTH_WEST | DmaNeighbor.SOUTH | DmaNeighbor.SOUTH_EAST
+NEIGHBOR_ATTRIBS = (
+    (MAPPING__nw, DmaNeighbor.NORTH_WEST),
+    (MAPPING__n, DmaNeighbor.NORTH),
+    (MAPPING__ne, DmaNeighbor.NORTH_EAST),
+    (MAPPING__e, DmaNeighbor.EAST),
+    (MAPPING__se, DmaNeighbor.SOUTH_EAST),
+    (MAPPING__s, DmaNeighbor.SOUTH),
+    (MAPPING__sw, DmaNeighbor.SOUTH_WEST),
+    (MAPPING__w, DmaNeighbor.WEST),
+)
+# Reads the values of all neighbor attributes of a mapping as a tuple.
+_neighbor_values = itemgetter(*(key for key, __ in NEIGHBOR_ATTRIBS))
+# Only read from, so it's safe to share between imports.
+_VAR_MAP = get_rule_variations(REMAP_RULES)
+
+
+@lru_cache(maxsize=256)
+def _neighbor_mask(values: Tuple[str, ...]) -> int:
+    """Returns the DmaNeighbor mask for the values of the neighbor attributes, in the order of NEIGHBOR_ATTRIBS."""
+    mask = 0
+    for value, (__, bit) in zip(values, NEIGHBOR_ATTRIBS):
+        if value == '1':
+            mask |= bit
+        elif value != '0':
+            raise ValueError(f(_("Error when importing mapping. Invalid neighbor value: '{value}'. "
+                                 "Neighbors must be either 0 or 1.")))
+    return mask
 
 
 class ExplorersDtefImporter:
@@ -55,68 +89,76 @@ class ExplorersDtefImporter:
         self.dpci = dpci
         self.dpl = dpl
         self.dpla = dpla
+        self._reset()
 
+    def _reset(self):
         self._dirname = None
-        self._tileset_file_map: Dict[str, Image.Image] = {}
+        # Original (width, height) of the tilesets.
+        self._tileset_dims: Dict[str, Tuple[int, int]] = {}
+        # Pixel data of the tilesets, split into chunks (see _split_chunks).
+        self._tileset_chunks: Dict[str, np.ndarray] = {}
+        # For each variation tileset and chunk [chunk_y, chunk_x]: Whether the chunk is empty (see _import_tileset).
+        self._empty_mask: Dict[str, np.ndarray] = {}
         self._tileset_chunk_map: Dict[str, Dict[Tuple[int, int], int]] = {}
-        self._xml: Optional[Element] = None
 
-        # The individual
-        self._chunks: List[Image.Image] = [Image.new('P', (CHUNK_DIM, CHUNK_DIM))]
+        # The individual chunks, side by side. Grows when full. The first chunk is always empty.
+        self._chunk_buf = np.zeros((CHUNK_DIM, CHUNK_DIM * CHUNK_BUF_INITIAL_CAPACITY), np.uint8)
+        self._chunk_count = 1
+        # Raw pixel data of chunks -> index in self._chunk_buf, for de-duplication.
+        self._chunk_hash: Dict[bytes, int] = {EMPTY_BYTES: 0}
         self._palette: Optional[bytes] = None
         self._dpla__colors: List[List[int]] = []
         self._dpla__durations_per_frame_for_colors: List[int] = []
-        self._dma__original_chunk_mappings = dma.chunk_mappings
-        self.dma.chunk_mappings = [0 for _ in range(0, len(dma.chunk_mappings))]
 
     def do_import(self, dirname: str, fn_xml: str, fn_var0: str, fn_var1: str, fn_var2: str):
+        original_chunk_mappings = self.dma.chunk_mappings
         try:
-            self.__init__(self.dma, self.dpc, self.dpci, self.dpl, self.dpla)  # reset
+            self._reset()
+            self.dma.chunk_mappings = [0] * len(original_chunk_mappings)
 
             self._dirname = dirname
             self._assert_file_exists(fn_xml)
-            self._open_tileset(fn_var0)
-            self._open_tileset(fn_var1)
-            self._open_tileset(fn_var2)
-            self._xml = ElementTree.parse(fn_xml).getroot()
-            validate_xml_tag(self._xml, DUNGEON_TILESET)
-            validate_xml_attribs(self._xml, [DIMENSIONS])
-            if int(self._xml.attrib[DIMENSIONS]) != CHUNK_DIM:
-                # noinspection PyUnusedLocal
-                dim = self._xml.attrib[DIMENSIONS]
-                raise ValueError(f(_("Invalid tileset. Tileset has chunk dimensions of {dim}px, "
-                                     "but only {CHUNK_DIM}px are supported.")))
-
-            var_map = get_rule_variations(REMAP_RULES)
-            ts = [os.path.basename(fn_var0), os.path.basename(fn_var1), os.path.basename(fn_var2)]
-            for i, fn in enumerate(ts):
-                self._import_tileset(fn, var_map, DmaType.WALL, 0, 0, TILESHEET_WIDTH, TILESHEET_HEIGHT, i, ts[i-1] if i > 0 else None)
-                self._import_tileset(fn, var_map, DmaType.WATER, TILESHEET_WIDTH, 0, TILESHEET_WIDTH, TILESHEET_HEIGHT, i, ts[i-1] if i > 0 else None)
-                self._import_tileset(fn, var_map, DmaType.FLOOR, TILESHEET_WIDTH * 2, 0, TILESHEET_WIDTH, TILESHEET_HEIGHT, i, ts[i-1] if i > 0 else None)
-
-            ani0 = [[] for __ in range(0, 16)]
-            ani1 = [[] for __ in range(0, 16)]
-            dur0 = [6 for __ in range(0, 16)]
-            dur1 = [6 for __ in range(0, 16)]
-            for child in self._xml:
-                if child.tag == ANIMATION:
-                    validate_xml_attribs(child, [ANIMATION__PALETTE])
-                    if child.attrib[ANIMATION__PALETTE] == "10":
-                        if len(child) > 0:
-                            ani0, dur0 = self._prepare_import_animation(child)
-                    elif child.attrib[ANIMATION__PALETTE] == "11":
-                        if len(child) > 0:
-                            ani1, dur1 = self._prepare_import_animation(child)
-                    else:
-                        raise ValueError(_("Invalid animation: Animation is only supported for palettes 10 and 11."))
-                if child.tag == ADDITIONAL_TILES:
-                    self._import_additional_tiles(child, dirname)
+            ts = [self._open_tileset(fn_var0), self._open_tileset(fn_var1), self._open_tileset(fn_var2)]
+            # Close the file right away if the import fails, not only once the generator is collected.
+            with closing(self._iter_xml(fn_xml)) as xml_children:
+                root = next(xml_children)
+                validate_xml_tag(root, DUNGEON_TILESET)
+                validate_xml_attribs(root, [DIMENSIONS])
+                if int(root.attrib[DIMENSIONS]) != CHUNK_DIM:
+                    # noinspection PyUnusedLocal
+                    dim = root.attrib[DIMENSIONS]
+                    raise ValueError(f(_("Invalid tileset. Tileset has chunk dimensions of {dim}px, "
+                                         "but only {CHUNK_DIM}px are supported.")))
+
+                var_map = _VAR_MAP
+                for i, fn in enumerate(ts):
+                    self._import_tileset(fn, var_map, DmaType.WALL, 0, 0, TILESHEET_WIDTH, TILESHEET_HEIGHT, i, ts[i-1] if i > 0 else None)
+                    self._import_tileset(fn, var_map, DmaType.WATER, TILESHEET_WIDTH, 0, TILESHEET_WIDTH, TILESHEET_HEIGHT, i, ts[i-1] if i > 0 else None)
+                    self._import_tileset(fn, var_map, DmaType.FLOOR, TILESHEET_WIDTH * 2, 0, TILESHEET_WIDTH, TILESHEET_HEIGHT, i, ts[i-1] if i > 0 else None)
+
+                ani0 = [[] for __ in range(0, 16)]
+                ani1 = [[] for __ in range(0, 16)]
+                dur0 = [6 for __ in range(0, 16)]
+                dur1 = [6 for __ in range(0, 16)]
+                for child in xml_children:
+                    if child.tag == ANIMATION:
+                        validate_xml_attribs(child, [ANIMATION__PALETTE])
+                        if child.attrib[ANIMATION__PALETTE] == "10":
+                            if len(child) > 0:
+                                ani0, dur0 = self._prepare_import_animation(child)
+                        elif child.attrib[ANIMATION__PALETTE] == "11":
+                            if len(child) > 0:
+                                ani1, dur1 = self._prepare_import_animation(child)
+                        else:
+                            raise ValueError(_("Invalid animation: Animation is only supported for palettes 10 and 11."))
+                    if child.tag == ADDITIONAL_TILES:
+                        self._import_additional_tiles(child, dirname)
             self._import_animation(ani0, ani1, dur0, dur1)
 
             self._finalize()
         except BaseException:
             # Reset DMA
-            self.dma.chunk_mappings = self._dma__original_chunk_mappings
+            self.dma.chunk_mappings = original_chunk_mappings
             raise
 
     @staticmethod
@@ -124,67 +166,122 @@ class ExplorersDtefImporter:
         if not os.path.exists(fn):
             raise ValueError(f(_("A required DTEF file is missing: {fn}. Please verify the DTEF package.")))
 
-    def _open_tileset(self, fn):
+    @staticmethod
+    def _iter_xml(fn_xml) -> Iterator[Element]:
+        """
+        Streams the XML file. First yields the root element (only its attributes are usable at that point),
+        then each direct child of the root, once it's fully parsed. Children are cleared after they were handled,
+        so only one sub-tree is kept in memory at a time.
+        The file is closed when the generator is exhausted or closed.
+        """
+        with open(fn_xml, 'rb') as file:
+            xml_iter = ElementTree.iterparse(file, events=('start', 'end'))
+            __, root = next(xml_iter)
+            yield root
+            depth = 0
+            for event, elem in xml_iter:
+                if event == 'start':
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth == 0:
+                    yield elem
+                    elem.clear()
+            root.clear()
+
+    def _open_tileset(self, fn) -> str:
+        """Opens and validates a tileset file and returns the name it is registered under (its basename)."""
         self._assert_file_exists(fn)
         basename = os.path.basename(fn)
-        pil = self._tileset_file_map[basename] = Image.open(fn)
+        # Only the pixel data and palette are needed, the image itself is not kept.
+        with Image.open(fn) as pil:
+            if pil.mode != 'P':
+                raise ValueError(f(_('Can not import image "{basename}" as dungeon tileset: '
+                                     'Must be indexed image (=using a palette)')))
+            if pil.palette.mode != 'RGB':
+                raise ValueError(f(_('Can not import image "{basename}" as dungeon tileset: '
+                                     'Palette must contain  256 RGB colors.')))
+            pal_bytes = bytes(pil.palette.palette)
+            if self._palette is None:
+                self._palette = pal_bytes
+            elif pal_bytes != self._palette:
+                raise ValueError(f(_('Can not import images as dungeon tilesets: '
+                                     'The palettes of the images do not match. First image read that didn\'t match: '
+                                     '"{basename}"')))
+            self._tileset_dims[basename] = pil.size
+            arr = np.asarray(pil)
         self._tileset_chunk_map[basename] = {}
-        if pil.mode != 'P':
-            raise ValueError(f(_('Can not import image "{basename}" as dungeon tileset: '
-                                 'Must be indexed image (=using a palette)')))
-        if pil.palette.mode != 'RGB':
-            raise ValueError(f(_('Can not import image "{basename}" as dungeon tileset: '
-                                 'Palette must contain  256 RGB colors.')))
-        if self._palette is None:
-            self._palette = bytes(pil.palette.palette)
-        if pil.palette.palette != self._palette:
-            raise ValueError(f(_('Can not import images as dungeon tilesets: '
-                                 'The palettes of the images do not match. First image read that didn\'t match: '
-                                 '"{basename}"')))
+        pad_y, pad_x = -arr.shape[0] % CHUNK_DIM, -arr.shape[1] % CHUNK_DIM
+        if pad_y or pad_x:
+            arr = np.pad(arr, ((0, pad_y), (0, pad_x)), 'constant')
+        self._tileset_chunks[basename] = self._split_chunks(arr)
+        return basename
 
     def _import_tileset(self, fn: str, rule_map: Dict[int, Set[int]], typ: DmaType, bx, by, w, h, var_id, prev_fn: str):
-        assert fn in self._tileset_file_map, f(_("Logic error: Tileset file {fn} was not loaded."))
+        assert fn in self._tileset_chunks, f(_("Logic error: Tileset file {fn} was not loaded."))
         assert fn in self._tileset_chunk_map, f(_("Logic error: Tileset file {fn} was not loaded."))
-        tileset = self._tileset_file_map[fn]
-        if tileset.height < by + h or tileset.width < bx + w:
-            raise ValueError(f(_("Image '{fn}' is too small ({tileset.width}x{tileset.height}px), must be at least "
+        width, height = self._tileset_dims[fn]
+        if height < by + h or width < bx + w:
+            raise ValueError(f(_("Image '{fn}' is too small ({width}x{height}px), must be at least "
                                  "{bx+w}x{by+h}px.")))
+        chunks = self._tileset_chunks[fn]
+        pad_y = max(0, by + h - chunks.shape[0])
+        pad_x = max(0, bx + w - chunks.shape[1])
+        if pad_y or pad_x:
+            # Everything outside of the image is treated as empty.
+            chunks = self._tileset_chunks[fn] = np.pad(chunks, ((0, pad_y), (0, pad_x), (0, 0), (0, 0)), 'constant')
+            self._empty_mask.pop(fn, None)
+        if fn not in self._empty_mask:
+            self._empty_mask[fn] = ~chunks.any(axis=(2, 3))
+        empty_mask = self._empty_mask[fn]
 
         # We need to import the full wall tile first
         if typ == DmaType.WALL and var_id == 0:
             assert FULL in rule_map, _("A rule is missing in the import set")
             i = list(rule_map.keys()).index(FULL)
             x = bx + (i % w)
-            y = by + floor(i / w)
-            cropped = tileset.crop(
-                (x * CHUNK_DIM, y * CHUNK_DIM, (x + 1) * CHUNK_DIM, (y + 1) * CHUNK_DIM)
-            )
-            chunk_index = self._insert_chunk_or_reuse(cropped)
+            y = by + i // w
+            chunk_index = self._insert_chunk_or_reuse(chunks[y, x].tobytes())
             self._tileset_chunk_map[fn][(x, y)] = chunk_index
             # We don't need to assign the DMA index, we will do this below.
 
         for i, rules in enumerate(rule_map.values()):
             x = bx + (i % w)
-            y = by + floor(i / w)
-            cropped = tileset.crop(
-                (x * CHUNK_DIM, y * CHUNK_DIM, (x + 1) * CHUNK_DIM, (y + 1) * CHUNK_DIM)
-            )
-            if var_id > 0 and list(cropped.getdata()) == EMPTY_IMAGE:
+            y = by + i // w
+            if var_id > 0 and empty_mask[y, x]:
                 # Empty tile in variation, use previous variation.
                 chunk_index = self._tileset_chunk_map[prev_fn][(x, y)]
             else:
-                chunk_index = self._insert_chunk_or_reuse(cropped)
+                chunk_index = self._insert_chunk_or_reuse(chunks[y, x].tobytes())
             self._tileset_chunk_map[fn][(x, y)] = chunk_index
             for rule in rules:
                 self.dma.set(typ, rule, var_id, chunk_index)
 
-    def _insert_chunk_or_reuse(self, new_chunk):
-        for i, chunk in enumerate(self._chunks):
-            if chunk.getdata() == new_chunk.getdata():
-                return i
+    @staticmethod
+    def _split_chunks(tileset_np: np.ndarray) -> np.ndarray:
+        """
+        Returns the pixel data of a tileset, indexed by [chunk_y, chunk_x, y, x].
+        The data of each chunk is contiguous, so reading it for de-duplication is a plain copy.
+        """
+        return np.ascontiguousarray(tileset_np.reshape(
+            tileset_np.shape[0] // CHUNK_DIM, CHUNK_DIM, tileset_np.shape[1] // CHUNK_DIM, CHUNK_DIM
+        ).swapaxes(1, 2))
+
+    def _insert_chunk_or_reuse(self, new_chunk: bytes):
+        idx = self._chunk_hash.get(new_chunk)
+        if idx is not None:
+            return idx
 
-        self._chunks.append(new_chunk)
-        return len(self._chunks) - 1
+        idx = self._chunk_count
+        if (idx + 1) * CHUNK_DIM > self._chunk_buf.shape[1]:
+            new_buf = np.zeros((CHUNK_DIM, self._chunk_buf.shape[1] * 2), np.uint8)
+            new_buf[:, :self._chunk_buf.shape[1]] = self._chunk_buf
+            self._chunk_buf = new_buf
+        self._chunk_buf[:, idx * CHUNK_DIM:(idx + 1) * CHUNK_DIM] = \
+            np.frombuffer(new_chunk, np.uint8).reshape((CHUNK_DIM, CHUNK_DIM))
+        self._chunk_count += 1
+        self._chunk_hash[new_chunk] = idx
+        return idx
 
     def _import_additional_tiles(self, xml: Element, dirname):
         for tile in xml:
@@ -200,36 +297,21 @@ class ExplorersDtefImporter:
                         MAPPING__TYPE, MAPPING__nw, MAPPING__n, MAPPING__ne, MAPPING__e,
                         MAPPING__se, MAPPING__s, MAPPING__sw, MAPPING__w, MAPPING__VARIATION
                     ])
-                    n = 0
-                    if bool(int(mapping.attrib[MAPPING__nw])):
-                        n |= DmaNeighbor.NORTH_WEST
-                    if bool(int(mapping.attrib[MAPPING__n])):
-                        n |= DmaNeighbor.NORTH
-                    if bool(int(mapping.attrib[MAPPING__ne])):
-                        n |= DmaNeighbor.NORTH_EAST
-                    if bool(int(mapping.attrib[MAPPING__e])):
-                        n |= DmaNeighbor.EAST
-                    if bool(int(mapping.attrib[MAPPING__se])):
-                        n |= DmaNeighbor.SOUTH_EAST
-                    if bool(int(mapping.attrib[MAPPING__s])):
-                        n |= DmaNeighbor.SOUTH
-                    if bool(int(mapping.attrib[MAPPING__sw])):
-                        n |= DmaNeighbor.SOUTH_WEST
-                    if bool(int(mapping.attrib[MAPPING__w])):
-                        n |= DmaNeighbor.WEST
-
-                    if mapping.attrib[MAPPING__TYPE] == MAPPING__TYPE__FLOOR:
+                    attrib = mapping.attrib
+                    n = _neighbor_mask(_neighbor_values(attrib))
+
+                    if attrib[MAPPING__TYPE] == MAPPING__TYPE__FLOOR:
                         typ = DmaType.FLOOR
-                    elif mapping.attrib[MAPPING__TYPE] == MAPPING__TYPE__WALL:
+                    elif attrib[MAPPING__TYPE] == MAPPING__TYPE__WALL:
                         typ = DmaType.WALL
-                    elif mapping.attrib[MAPPING__TYPE] == MAPPING__TYPE__SECONDARY:
+                    elif attrib[MAPPING__TYPE] == MAPPING__TYPE__SECONDARY:
                         typ = DmaType.WATER
                     else:
                         # noinspection PyUnusedLocal
-                        mapping_type = mapping.attrib[MAPPING__TYPE]
+                        mapping_type = attrib[MAPPING__TYPE]
                         raise ValueError(f(_("Error when importing mapping. Unknown type: "
                                              "'{mapping_type}'.")))
-                    var_idx = int(mapping.attrib[MAPPING__VARIATION])
+                    var_idx = int(attrib[MAPPING__VARIATION])
                     if var_idx < 0 or var_idx > 2:
                         raise ValueError(f(_("Invalid variation index {var_idx}.")))
 
@@ -237,52 +319,58 @@ class ExplorersDtefImporter:
 
                 elif mapping.tag == SPECIAL_MAPPING:
                     validate_xml_attribs(mapping, [SPECIAL_MAPPING__IDENTIFIER])
-                    m = PATTERN_FLOOR1.match(mapping.attrib[SPECIAL_MAPPING__IDENTIFIER])
-                    if m:
-                        self.dma.set_extra(DmaExtraType.FLOOR1, int(m.group(1)), chunk)
-                    m = PATTERN_FLOOR2.match(mapping.attrib[SPECIAL_MAPPING__IDENTIFIER])
-                    if m:
-                        self.dma.set_extra(DmaExtraType.FLOOR2, int(m.group(1)), chunk)
-                    m = PATTERN_WALL_OR_VOID.match(mapping.attrib[SPECIAL_MAPPING__IDENTIFIER])
+                    m = PATTERN_EXTRA.match(mapping.attrib[SPECIAL_MAPPING__IDENTIFIER])
                     if m:
-                        self.dma.set_extra(DmaExtraType.WALL_OR_VOID, int(m.group(1)), chunk)
+                        self.dma.set_extra(EXTRA_TYPES[m.group(1)], int(m.group(2)), chunk)
 
     def _read_additional_chunk_idx(self, fn, x, y, dirname):
-        if fn not in self._tileset_file_map:
+        if fn not in self._tileset_chunks:
             self._open_tileset(os.path.join(dirname, fn))
-            tileset = self._tileset_file_map[fn]
-            for iy in range(0, tileset.height, CHUNK_DIM):
-                for ix in range(0, tileset.width, CHUNK_DIM):
-                    chunk_index = self._insert_chunk_or_reuse(tileset.crop((ix, iy, ix + CHUNK_DIM, iy + CHUNK_DIM)))
-                    self._tileset_chunk_map[fn][(floor(ix / CHUNK_DIM), floor(iy / CHUNK_DIM))] = chunk_index
+            chunks = self._tileset_chunks[fn]
+            for iy in range(0, chunks.shape[0]):
+                for ix in range(0, chunks.shape[1]):
+                    chunk_index = self._insert_chunk_or_reuse(chunks[iy, ix].tobytes())
+                    self._tileset_chunk_map[fn][(ix, iy)] = chunk_index
         return self._tileset_chunk_map[fn][(x, y)]
 
     def _merge_chunks(self):
-        new_img = Image.new('P', (CHUNK_DIM * len(self._chunks), CHUNK_DIM))
-        new_img.putpalette(self._chunks[1].getpalette())
-        for i, chunk in enumerate(self._chunks):
-            new_img.paste(chunk, (i * CHUNK_DIM, 0))
+        # Maps the used part of the chunk buffer directly (the stride skips the unused capacity), without copying.
+        new_img = Image.frombuffer('P', (CHUNK_DIM * self._chunk_count, CHUNK_DIM), self._chunk_buf,
+                                   'raw', 'P', self._chunk_buf.shape[1], 1)
+        new_img.putpalette(self._palette)
         return new_img
 
     def _prepare_import_animation(self, child):
-        colors = [[] for __ in range(0, 16)]
+        frames = list(child)
+        # One row per color, RGB values of all frames after each other.
+        colors = np.empty((16, len(frames) * 3), np.uint8)
         color_animations = []
         # If we have an old XML with duration on animation
         if ANIMATION__DURATION in child.attrib:
             color_animations = [int(child.attrib[ANIMATION__DURATION])] * 16
-        for frame in child:
+        for frame_idx, frame in enumerate(frames):
             validate_xml_tag(frame, FRAME)
             if len(frame) != 16:
                 raise ValueError(_("Error in the XML: One of the animation frames doesn't have 16 colors. Each frame "
                                    "must have a value for each color."))
             for i, color in enumerate(frame):
                 validate_xml_tag(color, COLOR)
-                colors[i] += self._convert_hex_str_color_to_tuple(color.text)
+                try:
+                    # An empty <Color/> has no text (TypeError), other invalid values give a ValueError.
+                    rgb = self._convert_hex_str_color_to_bytes(color.text)
+                except (TypeError, ValueError):
+                    rgb = b''
+                if len(rgb) != 3:
+                    raise ValueError(_("Error in the XML: One of the animation colors is not a valid color. Colors "
+                                       "must be encoded as six hexadecimal digits (rrggbb)."))
+                colors[i, frame_idx * 3:frame_idx * 3 + 3] = np.frombuffer(rgb, np.uint8)
                 if ANIMATION__DURATION in color.attrib:
                     color_animations.append(int(color.attrib[ANIMATION__DURATION]))
+            # Release the colors of this frame, they are no longer needed.
+            frame.clear()
         if len(color_animations) != 16:
             raise ValueError(_("Error in the XML: Durations for a palette or it's colors are not correctly defined."))
-        return colors, color_animations
+        return colors.tolist(), color_animations
 
     def _import_animation(self, ani0, ani1, dur0, dur1):
         self._dpla__colors = ani0 + ani1
@@ -296,5 +384,5 @@ class ExplorersDtefImporter:
         self.dpla.durations_per_frame_for_colors = self._dpla__durations_per_frame_for_colors
 
     @staticmethod
-    def _convert_hex_str_color_to_tuple(h: str) -> Tuple[int, ...]:
-        return tuple(int(h[i:i+2], 16) for i in (0, 2, 4))
+    def _convert_hex_str_color_to_bytes(h: str) -> bytes:
+        return bytes.fromhex(h)
@@ -0,0 +1,278 @@
+#  Copyright 2020-2021 Parakoopa and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+import os
+import random
+import tempfile
+import unittest
+from typing import List, Callable
+from xml.etree import ElementTree
+from xml.etree.ElementTree import Element, SubElement
+
+from PIL import Image
+
+from skytemple_dtef.dungeon_xml import ANIMATION, ANIMATION__PALETTE, FRAME, COLOR, ADDITIONAL_TILES, TILE, TILE__FILE, \
+    TILE__X, TILE__Y, SPECIAL_MAPPING, SPECIAL_MAPPING__IDENTIFIER, MAPPING, MAPPING__TYPE, MAPPING__TYPE__FLOOR, \
+    MAPPING__TYPE__SECONDARY, MAPPING__VARIATION, MAPPING__nw, MAPPING__n, MAPPING__ne, MAPPING__e, MAPPING__se, \
+    MAPPING__s, MAPPING__sw, MAPPING__w
+from skytemple_dtef.explorers_dtef import ExplorersDtef, VAR0_FN, VAR1_FN, VAR2_FN, TILESHEET_WIDTH, TW
+from skytemple_dtef.explorers_dtef_importer import ExplorersDtefImporter, FULL
+from skytemple_dtef.rules import get_rule_variations, REMAP_RULES
+from skytemple_files.common.tiled_image import TilemapEntry
+from skytemple_files.common.xml_util import prettify
+from skytemple_files.graphics.dma.handler import DmaHandler
+from skytemple_files.graphics.dma.model import Dma, DmaType, DmaExtraType, DmaNeighbor
+from skytemple_files.graphics.dpc.model import Dpc, DPC_TILING_DIM
+from skytemple_files.graphics.dpci.model import Dpci, DPCI_TILE_DIM
+from skytemple_files.graphics.dpl.model import Dpl
+from skytemple_files.graphics.dpla.model import Dpla, DPLA_COLORS_PER_PALETTE
+
+XML_FN = 'tileset.dtef.xml'
+NUMBER_PALETTES = 12
+NUMBER_ANIMATION_FRAMES = 3
+
+
+class ExplorersDtefRoundTripTestCase(unittest.TestCase):
+    """
+    Exports a generated tileset (using the DMA fixture for the mappings) with ExplorersDtef, imports it again with
+    ExplorersDtefImporter and checks that every DMA mapping still resolves to the same pixels and that the palette
+    animations survive.
+    """
+    def setUp(self):
+        rnd = random.Random(0)
+        with open(self.__fixture_path(), 'rb') as f:
+            self.dma = DmaHandler.deserialize(f.read())
+        number_chunks = max(self.dma.chunk_mappings) + 1
+        tiles_per_chunk = DPC_TILING_DIM * DPC_TILING_DIM
+        # Every chunk gets its own random tiles, so no chunk is empty.
+        self.dpci = Dpci(bytes(
+            rnd.randrange(1, 256) for __ in range(number_chunks * tiles_per_chunk * DPCI_TILE_DIM * DPCI_TILE_DIM // 2)
+        ))
+        self.dpc = Dpc(b'')
+        self.dpc.chunks = [
+            [TilemapEntry(ci * tiles_per_chunk + ti, False, False, rnd.randrange(NUMBER_PALETTES), True)
+             for ti in range(tiles_per_chunk)]
+            for ci in range(number_chunks)
+        ]
+        self.dpl = Dpl(b'')
+        self.dpl.palettes = [[rnd.randrange(256) for __ in range(16 * 3)] for __ in range(NUMBER_PALETTES)]
+        # Palette 10 is animated, palette 11 is not.
+        self.dpla = Dpla(b'', 0)
+        self.dpla.colors = [
+            [rnd.randrange(256) for __ in range(NUMBER_ANIMATION_FRAMES * 3)] for __ in range(DPLA_COLORS_PER_PALETTE)
+        ] + [[] for __ in range(DPLA_COLORS_PER_PALETTE)]
+        self.dpla.durations_per_frame_for_colors = [
+            rnd.randrange(1, 20) for __ in range(DPLA_COLORS_PER_PALETTE)
+        ] + [0 for __ in range(DPLA_COLORS_PER_PALETTE)]
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dir = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        self._export()
+        dma, dpc, dpci, dpl, dpla = self._import()
+
+        self.assertEqual(self._resolve(self.dma, self.dpc, self.dpci, self.dpl), self._resolve(dma, dpc, dpci, dpl),
+                         "All DMA mappings must resolve to the same chunk pixels after the round trip.")
+        self.assertEqual(self.dpla.colors, dpla.colors)
+        self.assertEqual(self.dpla.durations_per_frame_for_colors[:DPLA_COLORS_PER_PALETTE],
+                         dpla.durations_per_frame_for_colors[:DPLA_COLORS_PER_PALETTE])
+
+    def test_round_trip__empty_variation_chunks(self):
+        # Variations that are the same as the previous variation are left empty in the later variation files.
+        for rule in get_rule_variations(REMAP_RULES)[FULL]:
+            var0 = self.dma.get(DmaType.WALL, rule)[0]
+            self.dma.set(DmaType.WALL, rule, 1, var0)
+            self.dma.set(DmaType.WALL, rule, 2, var0)
+        self._export()
+        x, y = self._rule_coords(FULL)
+        for fn in (VAR1_FN, VAR2_FN):
+            with Image.open(os.path.join(self.dir, fn)) as img:
+                self.assertIsNone(img.crop((x * TW, y * TW, (x + 1) * TW, (y + 1) * TW)).getbbox(),
+                                  f"The full wall tile must be empty in {fn}.")
+        dma, dpc, dpci, dpl, dpla = self._import()
+
+        self.assertEqual(self._resolve(self.dma, self.dpc, self.dpci, self.dpl), self._resolve(dma, dpc, dpci, dpl),
+                         "All DMA mappings must resolve to the same chunk pixels after the round trip.")
+
+    def test_round_trip__undersized_variation(self):
+        # A variation file smaller than the tilesheet must behave as if the missing area was empty.
+        width, height = 10, 5
+        self._export()
+        with Image.open(os.path.join(self.dir, VAR1_FN)) as img:
+            img.load()
+        blanked = Image.new('P', img.size)
+        blanked.putpalette(img.getpalette())
+        blanked.paste(img.crop((0, 0, width * TW, height * TW)), (0, 0))
+        blanked.save(os.path.join(self.dir, VAR1_FN))
+        expected = self._resolve(*self._import()[:4])
+
+        img.crop((0, 0, width * TW, height * TW)).save(os.path.join(self.dir, VAR1_FN))
+        dma, dpc, dpci, dpl, dpla = self._import()
+
+        self.assertEqual(expected, self._resolve(dma, dpc, dpci, dpl),
+                         "An undersized variation file must import like one with the missing area left empty.")
+
+    def test_import__failure_keeps_mappings(self):
+        self._export()
+        dma = Dma(bytes(len(self.dma.chunk_mappings)))
+        dma.chunk_mappings = list(self.dma.chunk_mappings)
+        importer = ExplorersDtefImporter(dma, Dpc(b''), Dpci(b''), Dpl(b''), Dpla(b'', 0))
+        # Compared with assertTrue: a diff of the mapping lists is too slow to compute.
+        self.assertTrue(self.dma.chunk_mappings == dma.chunk_mappings, "Creating the importer must not touch the DMA.")
+        args = (self.dir, os.path.join(self.dir, XML_FN),
+                *(os.path.join(self.dir, fn) for fn in (VAR0_FN, VAR1_FN, VAR2_FN)))
+        with open(args[1], 'rb') as f:
+            valid_xml = f.read()
+
+        def invalid_palette(root: Element):
+            # Fails after the tilesets were already imported into the DMA.
+            root.findall(ANIMATION)[-1].attrib[ANIMATION__PALETTE] = "12"
+        self._edit_xml(invalid_palette)
+        with self.assertRaises(ValueError):
+            importer.do_import(*args)
+        self.assertTrue(self.dma.chunk_mappings == dma.chunk_mappings, "A failed import must leave the DMA unchanged.")
+
+        with open(args[1], 'wb') as f:
+            f.write(valid_xml)
+        importer.do_import(*args)
+        imported = list(dma.chunk_mappings)
+        self._edit_xml(invalid_palette)
+        with self.assertRaises(ValueError):
+            importer.do_import(*args)
+        self.assertTrue(imported == dma.chunk_mappings,
+                        "A failed import must leave the DMA as the previous import left it.")
+
+    def test_import__invalid_animation_color(self):
+        for value in ('', 'zz', 'abcd', 'aabbccdd'):
+            with self.subTest(value=value):
+                self._export()
+
+                def set_color(root: Element):
+                    root.find(ANIMATION).find(FRAME).find(COLOR).text = value or None
+                self._edit_xml(set_color)
+                with self.assertRaisesRegex(ValueError, 'not a valid color'):
+                    self._import()
+
+    def test_import__special_mappings(self):
+        self._export()
+        extras = ((DmaExtraType.FLOOR1, 0), (DmaExtraType.FLOOR2, 1), (DmaExtraType.WALL_OR_VOID, 2))
+        rules = list(get_rule_variations(REMAP_RULES).keys())[:len(extras)]
+        for rule, (extra_type, index) in zip(rules, extras):
+            self._add_additional_tile(rule, Element(SPECIAL_MAPPING, {
+                SPECIAL_MAPPING__IDENTIFIER: f'EOS_EXTRA_{extra_type.name}_{index}'
+            }))
+        dma = self._import()[0]
+        imported = list(dma.chunk_mappings)
+
+        chunks = [dma.get(DmaType.WALL, rule)[0] for rule in rules]
+        self.assertEqual(len(extras), len(set(chunks)))
+        for chunk, (extra_type, index) in zip(chunks, extras):
+            self.assertEqual(chunk, dma.get_extra(extra_type)[index])
+
+        # There is no third floor type, this is ignored.
+        self._add_additional_tile(rules[0], Element(SPECIAL_MAPPING, {
+            SPECIAL_MAPPING__IDENTIFIER: 'EOS_EXTRA_FLOOR3_1'
+        }))
+        self.assertTrue(imported == self._import()[0].chunk_mappings,
+                        "An unknown special mapping must not change the DMA.")
+
+    def test_import__mapping(self):
+        self._export()
+        before = list(self._import()[0].chunk_mappings)
+        # Not symmetric, so mixing up the directions or the meaning of 0 and 1 changes a different mapping.
+        self._add_additional_tile(FULL, self._mapping_element(MAPPING__TYPE__SECONDARY, 2, n='1', e='1'))
+        dma = self._import()[0]
+
+        chunk = dma.get(DmaType.WALL, FULL)[0]
+        self.assertEqual(chunk, dma.get(DmaType.WATER, DmaNeighbor.NORTH | DmaNeighbor.EAST)[2])
+        self.assertEqual(1, sum(a != b for a, b in zip(before, dma.chunk_mappings)),
+                         "The mapping must not change any other DMA entry.")
+
+    def test_import__invalid_neighbor_value(self):
+        for value in ('true', '00', '2'):
+            with self.subTest(value=value):
+                self._export()
+                mapping = self._mapping_element(MAPPING__TYPE__FLOOR, 0, nw=value)
+                self._add_additional_tile(FULL, mapping)
+                with self.assertRaisesRegex(ValueError, 'Invalid neighbor value'):
+                    self._import()
+
+    def _export(self):
+        dtef = ExplorersDtef(self.dma, self.dpc, self.dpci, self.dpl, self.dpla)
+        with open(os.path.join(self.dir, XML_FN), 'w') as f:
+            f.write(prettify(dtef.get_xml()))
+        for fn, img in zip(dtef.get_filenames(), dtef.get_tiles()):
+            img.save(os.path.join(self.dir, fn))
+
+    def _import(self):
+        dma = Dma(bytes(len(self.dma.chunk_mappings)))
+        dpc = Dpc(b'')
+        dpci = Dpci(b'')
+        dpl = Dpl(b'')
+        dpla = Dpla(b'', 0)
+        ExplorersDtefImporter(dma, dpc, dpci, dpl, dpla).do_import(
+            self.dir, os.path.join(self.dir, XML_FN),
+            *(os.path.join(self.dir, fn) for fn in (VAR0_FN, VAR1_FN, VAR2_FN))
+        )
+        return dma, dpc, dpci, dpl, dpla
+
+    def _edit_xml(self, edit: Callable[[Element], None]):
+        tree = ElementTree.parse(os.path.join(self.dir, XML_FN))
+        edit(tree.getroot())
+        tree.write(os.path.join(self.dir, XML_FN))
+
+    def _add_additional_tile(self, rule: int, *mappings: Element):
+        """Adds an additional tile that uses the chunk of the first variation of the wall rule."""
+        x, y = self._rule_coords(rule)
+
+        def add(root: Element):
+            additional_tiles = root.find(ADDITIONAL_TILES)
+            if additional_tiles is None:
+                additional_tiles = SubElement(root, ADDITIONAL_TILES)
+            tile = SubElement(additional_tiles, TILE, {TILE__FILE: VAR0_FN, TILE__X: str(x), TILE__Y: str(y)})
+            tile.extend(mappings)
+        self._edit_xml(add)
+
+    @staticmethod
+    def _mapping_element(typ: str, variation: int, **neighbors: str) -> Element:
+        """Returns a Mapping element. Neighbors that are not passed are set to 0."""
+        attribs = {MAPPING__TYPE: typ, MAPPING__VARIATION: str(variation)}
+        for key in (MAPPING__nw, MAPPING__n, MAPPING__ne, MAPPING__e, MAPPING__se, MAPPING__s, MAPPING__sw, MAPPING__w):
+            attribs[key] = neighbors.get(key, '0')
+        return Element(MAPPING, attribs)
+
+    @staticmethod
+    def _resolve(dma: Dma, dpc: Dpc, dpci: Dpci, dpl: Dpl) -> List[bytes]:
+        """Returns the RGB pixel data of the chunk each DMA mapping points to."""
+        data = dpc.chunks_to_pil(dpci, dpl.palettes, 1).convert('RGB').tobytes()
+        chunk_len = TW * TW * 3
+        return [data[i * chunk_len:(i + 1) * chunk_len] for i in dma.chunk_mappings]
+
+    @staticmethod
+    def _rule_coords(rule: int):
+        i = list(get_rule_variations(REMAP_RULES).keys()).index(rule)
+        return i % TILESHEET_WIDTH, i // TILESHEET_WIDTH
+
+    @staticmethod
+    def __fixture_path():
+        return os.path.abspath(
+            os.path.join(os.path.dirname(__file__),
+                         'fixtures',
+                         'dummy.dma')
+        )